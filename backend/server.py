@@ -14,13 +14,40 @@ import os
 import asyncio
 import logging
 from contextlib import asynccontextmanager
+from typing import Optional, Union
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+import msgspec
+from fastapi import FastAPI, WebSocket, Request
+from fastapi.websockets import WebSocketState
 from fastapi.middleware.cors import CORSMiddleware
 from websockets.asyncio.client import connect as ws_connect
 import websockets.exceptions
+from websockets.protocol import State
 from dotenv import load_dotenv
 
+from protocol import (
+    AUDIO_FRAME_PREFIX,
+    AUDIO_OPCODE,
+    SEND_QUEUE_SIZE,
+    SUBPROTOCOL,
+    Audio,
+    Configure,
+    Connected,
+    Error,
+    FrontendMessage,
+    FunctionCall,
+    FunctionResult,
+    ServiceMessage,
+    SessionClosed,
+    Status,
+    Text,
+    Transcript,
+    close_after_flush,
+    coalesce_frames,
+    coalesce_json,
+    run_coalescing_writer,
+)
+
 load_dotenv()
 
 # Configure logging
@@ -30,17 +57,118 @@ logger = logging.getLogger(__name__)
 # Voice service configuration
 VOICE_SERVICE_URL = os.environ.get("VOICE_SERVICE_URL", "ws://localhost:8001/ws/voice")
 
+# Idle, pre-connected voice service connections kept ready for new sessions
+# (0 disables the pool)
+VOICE_POOL_SIZE = int(os.environ.get("VOICE_POOL_SIZE", "4"))
+
+# Pool refill backoff (seconds) while the voice service refuses connections
+POOL_RETRY_MIN = 1.0
+POOL_RETRY_MAX = 30.0
+
 # Default instructions for the voice assistant
 DEFAULT_INSTRUCTIONS = """You are Eon, a helpful and friendly AI assistant. Respond naturally and conversationally."""
 
+# Codecs: JSON towards the frontend, MessagePack towards the voice service
+frontend_decoder = msgspec.json.Decoder(FrontendMessage)
+frontend_encoder = msgspec.json.Encoder()
+# Batches decode to raw elements that are validated one by one, so an
+# unknown message drops only itself rather than the whole array
+voice_decoder = msgspec.msgpack.Decoder(Union[ServiceMessage, list[msgspec.Raw]])
+voice_message_decoder = msgspec.msgpack.Decoder(ServiceMessage)
+voice_encoder = msgspec.msgpack.Encoder()
+
+# Constant frontend frames, encoded once
+CONNECTED_FRAME = frontend_encoder.encode(Connected()).decode()
+
+# Voice service connection pool. Each connection serves one session (the
+# voice service binds a connection to a single configure), so every
+# connection taken out is replaced in the background by a single refill
+# task.
+voice_pool: asyncio.Queue = asyncio.Queue(maxsize=VOICE_POOL_SIZE)
+pool_refill: Optional[asyncio.Task] = None
+
+
+async def open_voice_connection(url: str = VOICE_SERVICE_URL):
+    """Open a connection to the voice service on the internal MessagePack hop."""
+    # Trusted internal hop: frames are binary (no UTF-8 validation),
+    # coalesced batches may exceed the default 1 MiB frame limit, and
+    # PCM audio does not compress well enough to pay for permessage-deflate
+    voice_ws = await ws_connect(
+        url,
+        subprotocols=[SUBPROTOCOL],
+        max_size=None,
+        compression=None,
+    )
+    if voice_ws.subprotocol != SUBPROTOCOL:
+        await voice_ws.close()
+        raise RuntimeError(f"Voice service did not accept the {SUBPROTOCOL} subprotocol")
+    return voice_ws
+
+
+async def refill_voice_pool() -> None:
+    """
+    Open voice service connections until the pool is full.
+
+    Connects one at a time. After a failed connect it waits before the
+    next attempt, doubling the wait up to POOL_RETRY_MAX, so a voice
+    service that is down is not hit with a pool's worth of handshakes
+    per new session.
+    """
+    delay = POOL_RETRY_MIN
+    while voice_pool.qsize() < VOICE_POOL_SIZE:
+        try:
+            voice_ws = await open_voice_connection()
+        except Exception as e:
+            logger.warning(f"Could not pre-connect to voice service (retrying in {delay:.0f}s): {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POOL_RETRY_MAX)
+            continue
+        delay = POOL_RETRY_MIN
+        try:
+            voice_pool.put_nowait(voice_ws)
+        except asyncio.QueueFull:
+            await voice_ws.close()
+
+
+def replenish_voice_pool() -> None:
+    """Start the refill task unless it is already running (or backing off)."""
+    global pool_refill
+    if VOICE_POOL_SIZE and (pool_refill is None or pool_refill.done()):
+        pool_refill = asyncio.create_task(refill_voice_pool())
+
+
+async def acquire_voice_connection(user_id: str):
+    """
+    Get a voice service connection for a new session.
+
+    Takes an idle pooled connection when one is still open, skipping any
+    the voice service closed while they sat idle, and falls back to
+    connecting directly when the pool is empty.
+    """
+    while True:
+        try:
+            voice_ws = voice_pool.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        replenish_voice_pool()
+        if voice_ws.state is State.OPEN:
+            return voice_ws
+    replenish_voice_pool()
+    return await open_voice_connection(f"{VOICE_SERVICE_URL}?user_id={user_id}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     logger.info("Eon backend starting...")
     logger.info(f"Voice Service URL: {VOICE_SERVICE_URL}")
+    replenish_voice_pool()
     yield
     logger.info("Eon backend shutting down...")
+    if pool_refill is not None:
+        pool_refill.cancel()
+    while not voice_pool.empty():
+        await voice_pool.get_nowait().close()
 
 
 app = FastAPI(title="Eon Backend", lifespan=lifespan)
@@ -90,11 +218,12 @@ async def voice_websocket(websocket: WebSocket, user_id: str = "anonymous"):
     WebSocket endpoint for voice/text communication.
 
     Accepts:
+    - Binary frame: 0x01 + raw PCM16 audio
     - {type: "text", text: "..."} - Text input
     - {type: "audio", data: "..."} - Base64 PCM16 audio
 
     Sends:
-    - {type: "audio", data: "..."} - Base64 PCM16 audio response
+    - Binary frame: 0x01 + raw PCM16 audio response
     - {type: "transcript", text: "..."} - Response transcript
     - {type: "status", state: "..."} - Status updates
     - {type: "function_call", name: "...", call_id: "...", arguments: {...}}
@@ -104,48 +233,52 @@ async def voice_websocket(websocket: WebSocket, user_id: str = "anonymous"):
     await websocket.accept()
     logger.info(f"WebSocket connected: user_id={user_id}")
 
-    # Connect to voice service
-    voice_ws_url = f"{VOICE_SERVICE_URL}?user_id={user_id}"
-    logger.info(f"Connecting to voice service: {voice_ws_url}")
-
     try:
-        async with ws_connect(voice_ws_url) as voice_ws:
+        # Usually a pre-warmed connection, so the handshake is already done
+        async with await acquire_voice_connection(user_id) as voice_ws:
             logger.info("Connected to voice service")
 
-            # Send configuration to voice service
-            config_msg = {
-                "type": "configure",
-                "instructions": DEFAULT_INSTRUCTIONS,
-                "tools": []  # Add tools here if needed
-            }
-            await voice_ws.send(str_to_json_bytes(config_msg))
+            # Send configuration to voice service; the user is only known
+            # now, so it travels here rather than in the connection URL
+            config_msg = Configure(
+                instructions=DEFAULT_INSTRUCTIONS,
+                tools=[],  # Add tools here if needed
+                user_id=user_id,
+            )
+            await voice_ws.send(voice_encoder.encode(config_msg))
             logger.info("Sent configuration to voice service")
 
             # Send connected status to frontend
-            await websocket.send_json({"type": "connected"})
+            await websocket.send_text(CONNECTED_FRAME)
 
             # Run bidirectional forwarding
             await run_bidirectional_forwarding(websocket, voice_ws, user_id)
 
-    except websockets.exceptions.InvalidStatusCode as e:
-        error_msg = f"Voice service connection failed: {e.status_code}"
-        logger.error(error_msg)
-        await websocket.send_json({"type": "error", "message": error_msg})
+    except websockets.exceptions.InvalidStatus as e:
+        # The voice service refused the handshake; its response body says why
+        status_code = e.response.status_code
+        error_msg = bytes(e.response.body).decode(errors="replace").strip()
+        if not error_msg:
+            error_msg = f"Voice service connection failed: {status_code}"
+        logger.error(f"Voice service refused the session ({status_code}): {error_msg}")
+        await websocket.send_text(frontend_encoder.encode(Error(message=error_msg)).decode())
     except websockets.exceptions.ConnectionClosed as e:
         logger.warning(f"Voice service connection closed: {e}")
     except Exception as e:
         logger.error(f"Error connecting to voice service: {e}")
-        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.send_text(frontend_encoder.encode(Error(message=str(e))).decode())
     finally:
+        # uvicorn does not close the socket when the handler returns, so a
+        # session that ended on the voice service side would otherwise leave
+        # the browser connected until it times out
+        if websocket.client_state is WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except Exception:
+                pass
         logger.info(f"Session ended: user_id={user_id}")
 
 
-def str_to_json_bytes(data: dict) -> str:
-    """Convert dict to JSON string for WebSocket."""
-    import json
-    return json.dumps(data)
-
-
 async def run_bidirectional_forwarding(
     frontend_ws: WebSocket,
     voice_ws,
@@ -166,112 +299,135 @@ async def run_bidirectional_forwarding(
     - function_call messages
     - speech_started/stopped messages
     - error messages
+
+    Audio travels as binary audio frames end to end and is passed through
+    without being decoded. Other frontend frames are JSON; other voice
+    service frames are MessagePack (see protocol.py). Each direction is
+    written by its own coalescing writer, so a frame may carry a single
+    message or an array of messages.
     """
-    import json
+    to_voice: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+    to_frontend: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
 
     async def forward_to_voice_service():
         """Forward messages from frontend to voice service."""
         try:
             while True:
-                data = await frontend_ws.receive_json()
-                msg_type = data.get("type")
-
-                if msg_type == "text":
-                    # Forward text input
-                    logger.info(f"[{user_id}] Forwarding text: {data.get('text', '')[:50]}...")
-                    await voice_ws.send(json.dumps(data))
-
-                elif msg_type == "audio":
-                    # Forward audio input
-                    await voice_ws.send(json.dumps(data))
-
-                elif msg_type == "function_result":
-                    # Forward function result
-                    logger.info(f"[{user_id}] Forwarding function result: {data.get('call_id')}")
-                    await voice_ws.send(json.dumps(data))
-
-                elif msg_type == "mute":
-                    # Mute toggle - forward to voice service if it supports it
-                    await voice_ws.send(json.dumps(data))
-
-                else:
-                    logger.debug(f"[{user_id}] Unknown message type from frontend: {msg_type}")
-
-        except WebSocketDisconnect:
-            logger.info(f"[{user_id}] Frontend disconnected")
+                message = await frontend_ws.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+
+                # Binary frames carry audio as raw PCM16 behind a 1-byte opcode,
+                # which also skips UTF-8 validation of large text frames. They
+                # are already in the internal wire format and pass through as-is.
+                data = message.get("bytes")
+                if data is not None:
+                    if not data or data[0] != AUDIO_OPCODE:
+                        logger.debug("[%s] Unknown binary frame from frontend", user_id)
+                        continue
+                    await to_voice.put(data)
+                    continue
+
+                try:
+                    msg = frontend_decoder.decode(message["text"])
+                except msgspec.ValidationError as e:
+                    logger.debug("[%s] Unknown message from frontend: %s", user_id, e)
+                    continue
+
+                if isinstance(msg, Audio):
+                    await to_voice.put(AUDIO_FRAME_PREFIX + msg.data)
+                    continue
+
+                if isinstance(msg, Text):
+                    logger.info("[%s] Forwarding text: %.50s...", user_id, msg.text)
+                elif isinstance(msg, FunctionResult):
+                    logger.info("[%s] Forwarding function result: %s", user_id, msg.call_id)
+
+                # text, function_result and mute go to the voice service as MessagePack
+                await to_voice.put(voice_encoder.encode(msg))
+
+            logger.info("[%s] Frontend disconnected", user_id)
         except Exception as e:
-            logger.error(f"[{user_id}] Error forwarding to voice service: {e}")
+            logger.error("[%s] Error forwarding to voice service: %s", user_id, e)
+        await close_after_flush(to_voice)
 
     async def forward_from_voice_service():
         """Forward messages from voice service to frontend."""
         try:
-            import json
-            async for msg in voice_ws:
-                data = json.loads(msg)
-                msg_type = data.get("type")
-
-                # Forward all messages to frontend
-                if msg_type == "audio":
-                    await frontend_ws.send_json(data)
-
-                elif msg_type == "transcript":
-                    logger.info(f"[{user_id}] Transcript: {data.get('text', '')[:50]}...")
-                    await frontend_ws.send_json(data)
-
-                elif msg_type == "status":
-                    await frontend_ws.send_json(data)
-
-                elif msg_type == "function_call":
-                    # Forward function call - frontend or backend can handle it
-                    logger.info(f"[{user_id}] Function call: {data.get('name')}")
-                    await frontend_ws.send_json(data)
+            async for frame in voice_ws:
+                if frame[0] == AUDIO_OPCODE:
+                    # Audio frames are forwarded verbatim, never decoded
+                    await to_frontend.put(frame)
+                    continue
+
+                try:
+                    payload = voice_decoder.decode(frame)
+                except msgspec.ValidationError as e:
+                    logger.debug("[%s] Unknown message from voice service: %s", user_id, e)
+                    continue
+
+                if isinstance(payload, list):
+                    messages = []
+                    for raw in payload:
+                        try:
+                            messages.append(voice_message_decoder.decode(raw))
+                        except msgspec.ValidationError as e:
+                            logger.debug("[%s] Unknown message from voice service: %s", user_id, e)
+                else:
+                    messages = (payload,)
 
-                elif msg_type == "speech_started":
-                    await frontend_ws.send_json(data)
+                for msg in messages:
+                    if isinstance(msg, Transcript):
+                        # One per transcript delta: keep it off INFO
+                        logger.debug("[%s] Transcript: %.50s...", user_id, msg.text)
 
-                elif msg_type == "speech_stopped":
-                    await frontend_ws.send_json(data)
+                    elif isinstance(msg, FunctionCall):
+                        # Forward function call - frontend or backend can handle it
+                        logger.info("[%s] Function call: %s", user_id, msg.name)
 
-                elif msg_type == "connected":
-                    # Voice service ready
-                    logger.info(f"[{user_id}] Voice service ready")
-                    await frontend_ws.send_json({"type": "status", "state": "ready"})
+                    elif isinstance(msg, Connected):
+                        # Voice service ready
+                        logger.info("[%s] Voice service ready", user_id)
+                        msg = Status(state="ready")
 
-                elif msg_type == "error":
-                    logger.error(f"[{user_id}] Voice service error: {data.get('message')}")
-                    await frontend_ws.send_json(data)
+                    elif isinstance(msg, Error):
+                        logger.error("[%s] Voice service error: %s", user_id, msg.message)
 
-                else:
-                    logger.debug(f"[{user_id}] Unknown message type from voice service: {msg_type}")
+                    await to_frontend.put(frontend_encoder.encode(msg).decode())
 
         except websockets.exceptions.ConnectionClosed:
-            logger.info(f"[{user_id}] Voice service connection closed")
+            logger.info("[%s] Voice service connection closed", user_id)
         except Exception as e:
-            logger.error(f"[{user_id}] Error receiving from voice service: {e}")
+            logger.error("[%s] Error receiving from voice service: %s", user_id, e)
+        await close_after_flush(to_frontend)
 
-    # Run both directions concurrently
-    forward_task = asyncio.create_task(forward_to_voice_service())
-    receive_task = asyncio.create_task(forward_from_voice_service())
+    async def send_to_frontend(frame: Union[str, bytes]):
+        if isinstance(frame, bytes):
+            await frontend_ws.send_bytes(frame)
+        else:
+            await frontend_ws.send_text(frame)
 
+    # Run both directions concurrently; the first task to raise
+    # (SessionClosed on disconnect) cancels all the others
     try:
-        # Wait for either task to complete (usually due to disconnect)
-        done, pending = await asyncio.wait(
-            [forward_task, receive_task],
-            return_when=asyncio.FIRST_COMPLETED
-        )
-
-        # Cancel pending tasks
-        for task in pending:
-            task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
-
-    except Exception as e:
-        logger.error(f"[{user_id}] Session error: {e}")
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(forward_to_voice_service())
+            tg.create_task(forward_from_voice_service())
+            tg.create_task(run_coalescing_writer(to_voice, voice_ws.send, coalesce_frames))
+            tg.create_task(run_coalescing_writer(to_frontend, send_to_frontend, coalesce_json))
+    except* SessionClosed:
+        pass
+    except* Exception as eg:
+        for e in eg.exceptions:
+            logger.error("[%s] Session error: %s", user_id, e)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Keepalive is protocol-level ping/pong sent by uvicorn (also set in the
+    # Dockerfile), so idle sessions survive proxies without app messages.
+    # permessage-deflate is off because this socket carries PCM audio.
+    uvicorn.run(
+        app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools", ws="websockets",
+        ws_ping_interval=20.0, ws_ping_timeout=20.0, ws_per_message_deflate=False,
+    )
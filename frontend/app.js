@@ -9,6 +9,7 @@
 const SAMPLE_RATE = 24000;
 const CHUNK_MS = 50;
 const CHUNK_SIZE = (SAMPLE_RATE * CHUNK_MS) / 1000; // 1200 samples per chunk
+const AUDIO_OPCODE = 0x01; // First byte of binary audio frames (raw PCM16 follows)
 
 // State
 let ws = null;
@@ -58,21 +59,17 @@ function calculateRMS(samples) {
 }
 
 /**
- * Convert Float32 samples to PCM16 base64
+ * Convert Float32 samples to a binary audio frame (opcode + PCM16 LE)
  */
-function floatToPCM16Base64(samples) {
-  const buffer = new ArrayBuffer(samples.length * 2);
+function floatToPCM16Frame(samples) {
+  const buffer = new ArrayBuffer(1 + samples.length * 2);
   const view = new DataView(buffer);
+  view.setUint8(0, AUDIO_OPCODE);
   for (let i = 0; i < samples.length; i++) {
     const s = Math.max(-1, Math.min(1, samples[i]));
-    view.setInt16(i * 2, s < 0 ? s * 0x8000 : s * 0x7fff, true);
+    view.setInt16(1 + i * 2, s < 0 ? s * 0x8000 : s * 0x7fff, true);
   }
-  const bytes = new Uint8Array(buffer);
-  let binary = '';
-  for (let i = 0; i < bytes.length; i++) {
-    binary += String.fromCharCode(bytes[i]);
-  }
-  return btoa(binary);
+  return buffer;
 }
 
 /**
@@ -84,8 +81,15 @@ function pcm16ToFloat32(base64) {
   for (let i = 0; i < binary.length; i++) {
     bytes[i] = binary.charCodeAt(i);
   }
-  const view = new DataView(bytes.buffer);
-  const samples = new Float32Array(bytes.length / 2);
+  return pcm16BytesToFloat32(bytes.buffer, 0);
+}
+
+/**
+ * Convert little-endian PCM16 bytes (starting at offset) to Float32 samples
+ */
+function pcm16BytesToFloat32(buffer, offset) {
+  const view = new DataView(buffer, offset);
+  const samples = new Float32Array(view.byteLength >> 1);
   for (let i = 0; i < samples.length; i++) {
     const int16 = view.getInt16(i * 2, true);
     samples[i] = int16 / (int16 < 0 ? 0x8000 : 0x7fff);
@@ -238,97 +242,122 @@ function clearAudioQueue() {
   isPlaying = false;
 }
 
+/**
+ * Queue decoded audio for playback
+ */
+function queueAudio(samples) {
+  console.log(`Received audio chunk from server (${samples.length} samples)`);
+  audioQueue.push(samples);
+  setSystemState('speaking');
+  playAudioQueue();
+}
+
 /**
  * Handle WebSocket messages
+ *
+ * Binary frames are audio (opcode byte + raw PCM16). Text frames are JSON;
+ * the backend coalesces messages that are ready at the same time, so a
+ * text frame carries either a single message object or an array of them.
  */
 async function handleMessage(event) {
+  if (event.data instanceof ArrayBuffer) {
+    if (event.data.byteLength > 1 && new Uint8Array(event.data)[0] === AUDIO_OPCODE) {
+      queueAudio(pcm16BytesToFloat32(event.data, 1));
+    }
+    return;
+  }
+
   try {
-    const data = JSON.parse(event.data);
+    const payload = JSON.parse(event.data);
+    const messages = Array.isArray(payload) ? payload : [payload];
+    for (const data of messages) {
+      await handleServerMessage(data);
+    }
+  } catch (e) {
+    console.error('Failed to parse message:', e);
+  }
+}
+
+/**
+ * Handle a single server message
+ */
+async function handleServerMessage(data) {
+  switch (data.type) {
+    case 'connected':
+      setConnectionState('connected');
+      setSystemState('ready');
+      break;
 
-    switch (data.type) {
-      case 'connected':
-        setConnectionState('connected');
+    case 'status':
+      if (data.state === 'listening') {
+        setSystemState('listening');
+      } else if (data.state === 'processing') {
+        setSystemState('processing');
+      } else if (data.state === 'ready') {
         setSystemState('ready');
-        break;
-
-      case 'status':
-        if (data.state === 'listening') {
-          setSystemState('listening');
-        } else if (data.state === 'processing') {
-          setSystemState('processing');
-        } else if (data.state === 'ready') {
-          setSystemState('ready');
-        }
-        break;
-
-      case 'audio':
-        console.log('Received audio chunk from server');
-        const samples = pcm16ToFloat32(data.data);
-        console.log(`Decoded ${samples.length} samples`);
-        audioQueue.push(samples);
-        setSystemState('speaking');
-        playAudioQueue();
-        break;
-
-      case 'transcript':
-        transcriptContainer.style.display = 'block';
-        transcriptText.textContent += data.text;
-        break;
-
-      case 'clear_audio':
-        // Barge-in: clear playback queue
-        clearAudioQueue();
-        break;
-
-      case 'mute_status':
-        muted = data.muted;
-        updateMuteUI();
-        break;
-
-      case 'error':
-        console.error('Server error:', data.message);
-        break;
-
-      case 'auth_required':
-        // Start OAuth session by setting cookie with user_id
-        console.log('Auth required, setting up OAuth session...');
+      }
+      break;
+
+    case 'audio':
+      queueAudio(pcm16ToFloat32(data.data));
+      break;
+
+    case 'transcript':
+      transcriptContainer.style.display = 'block';
+      transcriptText.textContent += data.text;
+      break;
+
+    case 'clear_audio':
+      // Barge-in: clear playback queue
+      clearAudioQueue();
+      break;
+
+    case 'mute_status':
+      muted = data.muted;
+      updateMuteUI();
+      break;
+
+    case 'error':
+      console.error('Server error:', data.message);
+      break;
+
+    case 'auth_required':
+      // Start OAuth session by setting cookie with user_id
+      console.log('Auth required, setting up OAuth session...');
+      try {
+        const token = sessionStorage.getItem('eon_access_token');
+        await fetch(`${EON_CONFIG.API_URL}/api/arcade/start-auth`, {
+          method: 'POST',
+          headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
+          },
+          credentials: 'include'  // Important: include cookies
+        });
+      } catch (e) {
+        console.warn('Failed to set OAuth session cookie:', e);
+      }
+
+      // Open OAuth popup for Google Calendar authorization
+      console.log('Opening popup:', data.auth_url);
+      const authPopup = window.open(data.auth_url, 'arcade_auth', 'width=500,height=700,popup=true');
+      // Poll for auth completion
+      const pollAuth = setInterval(async () => {
         try {
-          const token = sessionStorage.getItem('eon_access_token');
-          await fetch(`${EON_CONFIG.API_URL}/api/arcade/start-auth`, {
-            method: 'POST',
-            headers: {
-              'Authorization': `Bearer ${token}`,
-              'Content-Type': 'application/json'
-            },
-            credentials: 'include'  // Important: include cookies
-          });
+          const resp = await fetch(`${EON_CONFIG.API_URL}/api/arcade/auth/${data.auth_id}`);
+          const result = await resp.json();
+          if (result.status === 'completed') {
+            clearInterval(pollAuth);
+            if (authPopup && !authPopup.closed) authPopup.close();
+            console.log('Auth completed');
+          }
         } catch (e) {
-          console.warn('Failed to set OAuth session cookie:', e);
+          console.error('Auth poll error:', e);
         }
-
-        // Open OAuth popup for Google Calendar authorization
-        console.log('Opening popup:', data.auth_url);
-        const authPopup = window.open(data.auth_url, 'arcade_auth', 'width=500,height=700,popup=true');
-        // Poll for auth completion
-        const pollAuth = setInterval(async () => {
-          try {
-            const resp = await fetch(`${EON_CONFIG.API_URL}/api/arcade/auth/${data.auth_id}`);
-            const result = await resp.json();
-            if (result.status === 'completed') {
-              clearInterval(pollAuth);
-              if (authPopup && !authPopup.closed) authPopup.close();
-              console.log('Auth completed');
-            }
-          } catch (e) {
-            console.error('Auth poll error:', e);
-          }
-        }, 2000);
-        // Stop polling after 5 minutes
-        setTimeout(() => clearInterval(pollAuth), 300000);
-        break;
-    }
-  } catch (e) {
-    console.error('Failed to parse message:', e);
+      }, 2000);
+      // Stop polling after 5 minutes
+      setTimeout(() => clearInterval(pollAuth), 300000);
+      break;
   }
 }
 
@@ -345,6 +374,7 @@ function connectWebSocket() {
   const wsUrl = buildWebSocketUrl(baseUrl);
 
   ws = new WebSocket(wsUrl);
+  ws.binaryType = 'arraybuffer';
 
   ws.onopen = () => {
     console.log('WebSocket connected');
@@ -500,8 +530,8 @@ async function startMicrophone() {
 
       // Send to server if connected and not muted
       if (ws && ws.readyState === WebSocket.OPEN && !muted) {
-        const base64 = floatToPCM16Base64(samples);
-        ws.send(JSON.stringify({ type: 'audio', data: base64 }));
+        // Binary frame: no base64 or JSON encoding on the audio path
+        ws.send(floatToPCM16Frame(samples));
       }
     };
 
@@ -1,13 +1,15 @@
 """Base class for all-in-one voice adapters."""
 
+import asyncio
+import inspect
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Optional, Union
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class VoiceConfig:
-    """Configuration for voice adapter."""
+    """Configuration for voice adapter (one per session, never modified)."""
     endpoint: str
     api_key: str
     model: str
@@ -18,14 +20,59 @@ class VoiceConfig:
     greeting_cue: Optional[str] = None  # Specific greeting cue to use
 
 
+class _Callback:
+    """
+    Adapter callback attribute that is always awaitable once assigned.
+
+    Whether a callback is a coroutine function is decided once, on
+    assignment, instead of on every call: anything else is wrapped in a
+    coroutine function. There is no __get__, so reads are plain instance
+    attribute lookups.
+    """
+
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __set__(self, instance, callback):
+        if callback is not None and not asyncio.iscoroutinefunction(callback):
+            callback = _as_coroutine_function(callback)
+        instance.__dict__[self._name] = callback
+
+
+def _as_coroutine_function(callback: Callable) -> Callable:
+    """Wrap a plain callable so it can be awaited like an async callback."""
+    async def wrapper(*args):
+        result = callback(*args)
+        if inspect.isawaitable(result):
+            await result
+    return wrapper
+
+
 class VoiceAdapter(ABC):
     """
     Abstract base class for all-in-one voice adapters.
 
     All adapters implement the same interface, allowing swapping
     providers without changing the API contract.
+
+    Callbacks are async functions by contract and adapters await them
+    directly; plain callables are wrapped in a coroutine on assignment.
+
+    on_function_call(name, call) gets a dict with "call_id" and
+    "arguments" (a dict). Adapters may add "raw_arguments": the provider's
+    JSON text, only while it still encodes "arguments" exactly. The voice
+    service forwards it verbatim to JSON clients; MessagePack clients such
+    as the backend always get "arguments" encoded, so it is optional.
     """
 
+    on_audio = _Callback()
+    on_transcript = _Callback()
+    on_function_call = _Callback()
+    on_speech_started = _Callback()
+    on_speech_stopped = _Callback()
+    on_status = _Callback()
+    on_error = _Callback()
+
     def __init__(self, config: VoiceConfig):
         self.config = config
         # Callbacks - same for all adapters
@@ -48,8 +95,8 @@ class VoiceAdapter(ABC):
         pass
 
     @abstractmethod
-    async def send_audio(self, audio_base64: str) -> None:
-        """Send audio to voice service."""
+    async def send_audio(self, audio: Union[bytes, str]) -> None:
+        """Send audio to voice service (raw PCM16 bytes or base64 text)."""
         pass
 
     @abstractmethod
@@ -67,11 +114,3 @@ class VoiceAdapter(ABC):
     def name(cls) -> str:
         """Adapter name for config."""
         pass
-
-    async def _call_callback(self, callback: Callable, *args) -> None:
-        """Call a callback, handling both sync and async callbacks."""
-        import asyncio
-        if asyncio.iscoroutinefunction(callback):
-            await callback(*args)
-        else:
-            callback(*args)
@@ -1,17 +1,35 @@
 """Azure OpenAI Realtime API adapter."""
 
 import asyncio
-import json
 import logging
-from typing import Optional
+from typing import Optional, Union
 
+import msgspec
 from websockets.asyncio.client import connect as ws_connect
 import websockets
 
+from ..fastbase64 import b64encode, is_base64_text
 from .base import VoiceAdapter, VoiceConfig
 
 logger = logging.getLogger(__name__)
 
+# Pre-serialized message templates for the per-chunk send paths. Only the
+# variable part is encoded per call and spliced between prefix and suffix.
+_AUDIO_APPEND_PREFIX = b'{"type":"input_audio_buffer.append","audio":"'
+_AUDIO_APPEND_SUFFIX = b'"}'
+_USER_TEXT_PREFIX = (
+    b'{"type":"conversation.item.create","item":{"type":"message","role":"user",'
+    b'"content":[{"type":"input_text","text":'
+)
+_USER_TEXT_SUFFIX = b'}]}}'
+_RESPONSE_CREATE = b'{"type":"response.create"}'
+
+
+class _EventHead(msgspec.Struct):
+    """The fields of a server event needed to route it; the rest is skipped."""
+    type: str
+    delta: str = ""
+
 
 class OpenAIRealtimeAdapter(VoiceAdapter):
     """Adapter for Azure OpenAI Realtime API (all-in-one STT + LLM + TTS)."""
@@ -26,6 +44,32 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
         self._event_task: Optional[asyncio.Task] = None
         self._connected = False
 
+        # Per-session codecs. The head decoder reads just an event's type and
+        # streaming delta; audio append frames are assembled in a reused
+        # buffer that always starts with the message prefix.
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+        self._head_decoder = msgspec.json.Decoder(_EventHead)
+        self._audio_frame = bytearray(_AUDIO_APPEND_PREFIX)
+
+        # Event dispatch tables. Streaming deltas are routed on the decoded
+        # head alone and their handlers take just the delta; the other
+        # handled events are parsed completely first. Anything else is dropped.
+        self._delta_handlers = {
+            "response.audio.delta": self._handle_audio_delta,
+            "response.output_audio.delta": self._handle_audio_delta,
+            "response.audio_transcript.delta": self._handle_transcript_delta,
+            "response.output_audio_transcript.delta": self._handle_transcript_delta,
+        }
+        self._event_handlers = {
+            "input_audio_buffer.speech_started": self._handle_speech_started,
+            "input_audio_buffer.speech_stopped": self._handle_speech_stopped,
+            "conversation.item.input_audio_transcription.completed": self._handle_input_transcript,
+            "response.done": self._handle_response_done,
+            "response.function_call_arguments.done": self._handle_function_call,
+            "error": self._handle_error,
+        }
+
         # Build WebSocket URL (Azure OpenAI Preview format - supports voice config)
         # Per https://learn.microsoft.com/en-us/azure/ai-foundry/openai/how-to/realtime-audio-websockets
         endpoint = config.endpoint.rstrip('/')
@@ -40,12 +84,14 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
         headers = [("api-key", self.config.api_key)]
 
         logger.info(f"Connecting to: {self._ws_url}")
-        self._ws = await ws_connect(self._ws_url, additional_headers=headers)
+        # permessage-deflate costs a zlib pass per frame for base64 audio
+        # that barely compresses, so it is not negotiated
+        self._ws = await ws_connect(self._ws_url, additional_headers=headers, compression=None)
         logger.info("WebSocket connected")
 
         # Wait for session.created event
         msg = await self._ws.recv()
-        data = json.loads(msg)
+        data = self._decoder.decode(msg)
         if data.get("type") == "session.created":
             logger.info(f"Session created: {data.get('session', {}).get('id', 'unknown')}")
         else:
@@ -57,7 +103,7 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
 
         # Send ready status
         if self.on_status:
-            await self._call_callback(self.on_status, "ready")
+            await self.on_status("ready")
 
         # Start event processing loop
         self._event_task = asyncio.create_task(self._process_events())
@@ -94,17 +140,18 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
             "session": session_config
         }
 
-        logger.info(f"Sending session.update with voice={self.config.voice}: {json.dumps(update_msg)}")
-        await self._ws.send(json.dumps(update_msg))
+        payload = self._encoder.encode(update_msg)
+        logger.info(f"Sending session.update with voice={self.config.voice}: {payload.decode()}")
+        await self._ws.send(payload, text=True)
 
         # Wait for session.updated event
         msg = await self._ws.recv()
-        data = json.loads(msg)
+        data = self._decoder.decode(msg)
         if data.get("type") == "session.updated":
             session = data.get("session", {})
             session_voice = session.get("voice", "unknown")
             logger.info(f"Session configured - voice confirmed: {session_voice}")
-            logger.info(f"Full session.updated response: {json.dumps(data)}")
+            logger.info(f"Full session.updated response: {msg}")
         else:
             logger.warning(f"Unexpected response: {data.get('type')} - {data}")
 
@@ -139,12 +186,12 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
                 ]
             }
         }
-        await self._ws.send(json.dumps(system_item))
+        await self._ws.send(self._encoder.encode(system_item), text=True)
         logger.info(f"Added greeting system message: {greeting_system_msg[:80]}...")
 
         # Wait for conversation.item.created confirmation
         msg = await self._ws.recv()
-        data = json.loads(msg)
+        data = self._decoder.decode(msg)
         if data.get("type") == "conversation.item.created":
             logger.info("Greeting system message added to conversation")
         else:
@@ -157,7 +204,7 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
                 "modalities": ["text", "audio"]
             }
         }
-        await self._ws.send(json.dumps(greeting_response))
+        await self._ws.send(self._encoder.encode(greeting_response), text=True)
         logger.info(f"Triggered initial greeting with cue: {self.config.greeting_cue}")
 
     async def disconnect(self) -> None:
@@ -176,32 +223,40 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
 
         self._connected = False
 
-    async def send_audio(self, audio_base64: str) -> None:
-        """Send audio data to the API."""
+    async def send_audio(self, audio: Union[bytes, str]) -> None:
+        """Send audio data to the API (raw PCM16 bytes or base64 text)."""
         if not self._ws:
             raise RuntimeError("Not connected. Call connect() first.")
 
-        msg = {
-            "type": "input_audio_buffer.append",
-            "audio": audio_base64
-        }
-        await self._ws.send(json.dumps(msg))
+        if isinstance(audio, str):
+            # The voice service always passes bytes (msgspec decodes the
+            # base64); text is accepted for other callers of the adapter.
+            # Base64 never needs JSON escaping; anything outside its
+            # alphabet takes the slow path.
+            if not is_base64_text(audio):
+                msg = {"type": "input_audio_buffer.append", "audio": audio}
+                await self._ws.send(self._encoder.encode(msg), text=True)
+                return
+            encoded = audio.encode()
+        else:
+            # The API only takes base64, so encode at the last moment
+            encoded = b64encode(audio)
+
+        # send() has copied the frame out by the time it returns, so the
+        # buffer can be truncated back to the prefix and reused
+        frame = self._audio_frame
+        del frame[len(_AUDIO_APPEND_PREFIX):]
+        frame += encoded
+        frame += _AUDIO_APPEND_SUFFIX
+        await self._ws.send(frame, text=True)
 
     async def send_text(self, text: str) -> None:
         """Send text as user message (same as transcribed speech)."""
         if not self._ws:
             raise RuntimeError("Not connected. Call connect() first.")
 
-        msg = {
-            "type": "conversation.item.create",
-            "item": {
-                "type": "message",
-                "role": "user",
-                "content": [{"type": "input_text", "text": text}]
-            }
-        }
-        await self._ws.send(json.dumps(msg))
-        await self._ws.send(json.dumps({"type": "response.create"}))
+        await self._ws.send(_USER_TEXT_PREFIX + self._encoder.encode(text) + _USER_TEXT_SUFFIX, text=True)
+        await self._ws.send(_RESPONSE_CREATE, text=True)
 
     async def send_function_result(self, call_id: str, result: dict) -> None:
         """Send function call result back to the API."""
@@ -213,80 +268,96 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
             "item": {
                 "type": "function_call_output",
                 "call_id": call_id,
-                "output": json.dumps(result)
+                "output": self._encoder.encode(result).decode()
             }
         }
-        await self._ws.send(json.dumps(response_msg))
-        logger.info(f"Function output sent for call_id={call_id}")
+        await self._ws.send(self._encoder.encode(response_msg), text=True)
+        logger.info("Function output sent for call_id=%s", call_id)
 
         # Request new response to continue the conversation
-        await self._ws.send(json.dumps({"type": "response.create"}))
+        await self._ws.send(_RESPONSE_CREATE, text=True)
 
     async def _process_events(self) -> None:
         """Process events from the API."""
         try:
             async for msg in self._ws:
-                data = json.loads(msg)
-                await self._handle_event(data)
+                try:
+                    head = self._head_decoder.decode(msg)
+                except msgspec.ValidationError:
+                    # Unexpected shape (e.g. no type): take the slow path
+                    await self._handle_event(self._decoder.decode(msg))
+                    continue
+
+                # Streaming deltas are the bulk of the traffic; their payload
+                # is passed straight through, so the event is never built
+                handler = self._delta_handlers.get(head.type)
+                if handler is not None:
+                    await handler(head.delta)
+                    continue
+
+                handler = self._event_handlers.get(head.type)
+                if handler is not None:
+                    await handler(self._decoder.decode(msg))
         except asyncio.CancelledError:
             raise
         except websockets.exceptions.ConnectionClosed:
             logger.info("WebSocket connection closed")
         except Exception as e:
-            logger.error(f"Event processing error: {e}")
+            logger.error("Event processing error: %s", e)
             if self.on_error:
-                await self._call_callback(self.on_error, str(e))
+                await self.on_error(str(e))
 
     async def _handle_event(self, event: dict) -> None:
-        """Handle individual events."""
-        event_type = event.get("type", "unknown")
-
-        if event_type == "input_audio_buffer.speech_started":
-            if self.on_speech_started:
-                await self._call_callback(self.on_speech_started)
-            if self.on_status:
-                await self._call_callback(self.on_status, "listening")
-
-        elif event_type == "input_audio_buffer.speech_stopped":
-            if self.on_speech_stopped:
-                await self._call_callback(self.on_speech_stopped)
-            if self.on_status:
-                await self._call_callback(self.on_status, "processing")
-
-        elif event_type in ("response.audio.delta", "response.output_audio.delta"):
-            if self.on_audio:
-                await self._call_callback(self.on_audio, event.get("delta", ""))
-
-        elif event_type in ("response.audio_transcript.delta", "response.output_audio_transcript.delta"):
-            if self.on_transcript:
-                await self._call_callback(self.on_transcript, event.get("delta", ""))
-
-        elif event_type == "conversation.item.input_audio_transcription.completed":
-            # Log user's speech transcription
-            transcript = event.get("transcript", "")
-            logger.info(f"[{self.config.user_id}] User said: {transcript}")
-
-        elif event_type == "response.done":
-            # Log completed response info
-            response = event.get("response", {})
-            output = response.get("output", [])
-            for item in output:
-                if item.get("type") == "message":
-                    content = item.get("content", [])
-                    for c in content:
-                        if c.get("type") == "audio" and c.get("transcript"):
-                            logger.info(f"[{self.config.user_id}] Eon said: {c.get('transcript')}")
-            if self.on_status:
-                await self._call_callback(self.on_status, "ready")
-
-        elif event_type == "response.function_call_arguments.done":
-            await self._handle_function_call(event)
-
-        elif event_type == "error":
-            error_msg = event.get("error", {}).get("message", str(event))
-            logger.error(f"API error: {error_msg}")
-            if self.on_error:
-                await self._call_callback(self.on_error, error_msg)
+        """Handle a fully parsed event that did not fit the head decoder."""
+        handler = self._event_handlers.get(event.get("type", "unknown"))
+        if handler is not None:
+            await handler(event)
+
+    async def _handle_audio_delta(self, delta: str) -> None:
+        callback = self.on_audio
+        if callback is not None:
+            await callback(delta)
+
+    async def _handle_transcript_delta(self, delta: str) -> None:
+        callback = self.on_transcript
+        if callback is not None:
+            await callback(delta)
+
+    async def _handle_speech_started(self, event: dict) -> None:
+        if self.on_speech_started:
+            await self.on_speech_started()
+        if self.on_status:
+            await self.on_status("listening")
+
+    async def _handle_speech_stopped(self, event: dict) -> None:
+        if self.on_speech_stopped:
+            await self.on_speech_stopped()
+        if self.on_status:
+            await self.on_status("processing")
+
+    async def _handle_input_transcript(self, event: dict) -> None:
+        # Log user's speech transcription
+        transcript = event.get("transcript", "")
+        logger.info("[%s] User said: %s", self.config.user_id, transcript)
+
+    async def _handle_response_done(self, event: dict) -> None:
+        # Log completed response info
+        response = event.get("response", {})
+        output = response.get("output", [])
+        for item in output:
+            if item.get("type") == "message":
+                content = item.get("content", [])
+                for c in content:
+                    if c.get("type") == "audio" and c.get("transcript"):
+                        logger.info("[%s] Eon said: %s", self.config.user_id, c.get("transcript"))
+        if self.on_status:
+            await self.on_status("ready")
+
+    async def _handle_error(self, event: dict) -> None:
+        error_msg = event.get("error", {}).get("message", str(event))
+        logger.error("API error: %s", error_msg)
+        if self.on_error:
+            await self.on_error(error_msg)
 
     async def _handle_function_call(self, event: dict) -> None:
         """Handle function call from the model."""
@@ -294,24 +365,29 @@ class OpenAIRealtimeAdapter(VoiceAdapter):
         call_id = event.get("call_id", "")
         arguments_str = event.get("arguments", "")
 
-        logger.info(f"[{self.config.user_id}] Function call: {function_name} (call_id={call_id}) raw_args={arguments_str}")
+        logger.info("[%s] Function call: %s (call_id=%s) raw_args=%s", self.config.user_id, function_name, call_id, arguments_str)
 
-        # Parse arguments
+        # Parse arguments; the provider's JSON text is kept alongside while
+        # it still matches them exactly
+        raw_arguments = None
         try:
-            arguments = json.loads(arguments_str) if arguments_str else {}
-        except json.JSONDecodeError:
-            logger.error(f"[{self.config.user_id}] Failed to parse arguments: {arguments_str}")
+            arguments = self._decoder.decode(arguments_str) if arguments_str else {}
+            if arguments_str and isinstance(arguments, dict):
+                raw_arguments = arguments_str
+        except msgspec.DecodeError:
+            logger.error("[%s] Failed to parse arguments: %s", self.config.user_id, arguments_str)
             arguments = {}
 
         # Inject user_id for user-scoped functions
         if function_name in ("search_memory", "add_memory", "get_user_context", "forget_memory") or function_name.startswith("GoogleCalendar_"):
             arguments["user_id"] = self.config.user_id
-            logger.info(f"[{self.config.user_id}] Injected user_id into {function_name}")
+            raw_arguments = None
+            logger.info("[%s] Injected user_id into %s", self.config.user_id, function_name)
 
-        # Notify via callback
+        # Notify via callback ("raw_arguments", when present, is the exact
+        # JSON text of "arguments" and can be forwarded without re-encoding)
         if self.on_function_call:
-            await self._call_callback(
-                self.on_function_call,
-                function_name,
-                {"call_id": call_id, "arguments": arguments}
-            )
+            call = {"call_id": call_id, "arguments": arguments}
+            if raw_arguments is not None:
+                call["raw_arguments"] = raw_arguments
+            await self.on_function_call(function_name, call)
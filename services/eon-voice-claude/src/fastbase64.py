@@ -0,0 +1,31 @@
+"""
+Fast base64 helpers for the audio path.
+
+Audio is base64 in the provider's JSON API and raw PCM16 on the binary
+internal hop, so every chunk is encoded or decoded once. Uses pybase64
+(SIMD accelerated) when it is installed and falls back to the stdlib
+base64 module otherwise; both return bytes.
+"""
+
+import string
+
+try:
+    from pybase64 import b64decode, b64encode
+except ImportError:
+    from base64 import b64decode, b64encode
+
+__all__ = ["b64decode", "b64encode", "is_base64_text"]
+
+# Deletes every base64 alphabet character, so only foreign ones remain
+_B64_DELETE = str.maketrans("", "", string.ascii_letters + string.digits + "+/=")
+
+
+def is_base64_text(data: str) -> bool:
+    """
+    True if data uses only the base64 alphabet.
+
+    Such text needs no JSON escaping and can be spliced into a JSON string
+    as-is; quotes, backslashes and control characters (e.g. the line
+    breaks of MIME-wrapped base64) all fail the check.
+    """
+    return data.isascii() and not data.translate(_B64_DELETE)
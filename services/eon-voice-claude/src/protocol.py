@@ -0,0 +1,235 @@
+"""
+Wire protocol between the Eon backend and the voice service.
+
+Messages are tagged msgspec Structs (the tag is the "type" field). The
+same definitions encode to the JSON shapes the frontend speaks and to
+MessagePack on the internal backend <-> voice service hop, which is
+negotiated with the SUBPROTOCOL WebSocket subprotocol.
+
+On that hop every frame is binary. Audio frames are AUDIO_OPCODE followed
+by raw PCM16; any other frame is a MessagePack message or array of
+messages. MessagePack maps and arrays always start with a byte >= 0x80,
+so the two never collide.
+
+Both ends write their output through run_coalescing_writer, so any
+frame on that hop may carry an array of messages. JSON connections only
+carry arrays to receivers that accept them: the frontend, and voice
+service clients that configure with batch: true.
+
+Keep in sync with backend/protocol.py.
+"""
+
+import asyncio
+from typing import Any, Optional, Union
+
+import msgspec
+
+# WebSocket subprotocol for MessagePack frames on the internal hop
+SUBPROTOCOL = "eon-msgpack-v1"
+
+# First byte of binary audio frames (raw PCM16 follows)
+AUDIO_OPCODE = 0x01
+AUDIO_FRAME_PREFIX = bytes((AUDIO_OPCODE,))
+
+
+class Message(msgspec.Struct, tag_field="type", omit_defaults=True):
+    """Base class for all protocol messages."""
+
+
+# Messages sent by clients (frontend/backend) to the voice service
+
+class Configure(Message, tag="configure"):
+    instructions: Optional[str] = None
+    tools: list[dict] = []
+    greeting_cue: Optional[str] = None
+    # Overrides the user_id query parameter (pooled connections are opened
+    # before the user is known)
+    user_id: Optional[str] = None
+    # JSON clients only: exchange audio as binary audio frames instead of
+    # base64 in JSON (always the case on the MessagePack subprotocol)
+    binary_audio: bool = False
+    # JSON clients only: receive messages that are ready together as one
+    # JSON array frame (always the case on the MessagePack subprotocol)
+    batch: bool = False
+
+
+class Audio(Message, tag="audio"):
+    """PCM16 audio (base64 in JSON; sent as an audio frame on the internal hop)."""
+    data: bytes
+
+
+class Text(Message, tag="text"):
+    text: str = ""
+
+
+class FunctionResult(Message, tag="function_result"):
+    call_id: str
+    result: Any = {}
+
+
+class Mute(Message, tag="mute"):
+    muted: bool = False
+
+
+# Messages sent by the voice service to clients
+
+class Connected(Message, tag="connected"):
+    pass
+
+
+class Transcript(Message, tag="transcript"):
+    text: str
+
+
+class FunctionCall(Message, tag="function_call"):
+    name: str
+    call_id: str
+    arguments: dict
+
+
+class SpeechStarted(Message, tag="speech_started"):
+    pass
+
+
+class SpeechStopped(Message, tag="speech_stopped"):
+    pass
+
+
+class Status(Message, tag="status"):
+    state: str
+
+
+class Error(Message, tag="error"):
+    message: str
+
+
+FrontendMessage = Union[Audio, Text, FunctionResult, Mute]
+ClientMessage = Union[Configure, Audio, Text, FunctionResult, Mute]
+ServiceMessage = Union[
+    Audio, Transcript, FunctionCall, SpeechStarted, SpeechStopped, Status, Error, Connected
+]
+
+
+def pack_batch(frames: list[bytes]) -> bytes:
+    """Join already-encoded MessagePack messages into one MessagePack array."""
+    count = len(frames)
+    if count < 16:
+        header = bytes((0x90 | count,))
+    elif count < 0x10000:
+        header = b"\xdc" + count.to_bytes(2, "big")
+    else:
+        header = b"\xdd" + count.to_bytes(4, "big")
+    return header + b"".join(frames)
+
+
+def coalesce_frames(frames: list[bytes]) -> list[bytes]:
+    """
+    Merge queued binary frames into as few frames as possible, in order.
+
+    Consecutive audio frames become one audio frame with the PCM payloads
+    concatenated; consecutive MessagePack messages become one array.
+    """
+    merged = []
+    run: list[bytes] = []
+    for frame in frames:
+        if run and (frame[0] == AUDIO_OPCODE) != (run[0][0] == AUDIO_OPCODE):
+            merged.append(_merge_run(run))
+            run = []
+        run.append(frame)
+    if run:
+        merged.append(_merge_run(run))
+    return merged
+
+
+def _merge_run(run: list[bytes]) -> bytes:
+    if len(run) == 1:
+        return run[0]
+    if run[0][0] == AUDIO_OPCODE:
+        return AUDIO_FRAME_PREFIX + b"".join(memoryview(frame)[1:] for frame in run)
+    return pack_batch(run)
+
+
+# Outbound frame coalescing: messages that are ready while a write is in
+# flight are sent together as one array frame. This is the only corking
+# needed: asyncio and uvloop set TCP_NODELAY on every TCP transport, so
+# each frame goes out as soon as it is written.
+BATCH_MAX_MESSAGES = 128
+BATCH_MAX_SIZE = 16 * 1024
+SEND_QUEUE_SIZE = 512
+FLUSH_TIMEOUT = 1.0
+
+
+class SessionClosed(Exception):
+    """Raised inside a session's task group to end the session."""
+
+
+def coalesce_json(frames: list[Union[str, bytes]]) -> list[Union[str, bytes]]:
+    """
+    Merge queued frames of a JSON connection into as few frames as possible, in order.
+
+    Runs of JSON text messages become one JSON array frame; runs of binary
+    audio frames become one audio frame.
+    """
+    merged = []
+    start = 0
+    for end in range(1, len(frames) + 1):
+        if end < len(frames) and type(frames[end]) is type(frames[start]):
+            continue
+        run = frames[start:end]
+        if isinstance(run[0], bytes):
+            merged.extend(coalesce_frames(run))
+        elif len(run) == 1:
+            merged.append(run[0])
+        else:
+            merged.append("[" + ",".join(run) + "]")
+        start = end
+    return merged
+
+
+async def run_coalescing_writer(queue: asyncio.Queue, send, coalesce) -> None:
+    """
+    Send queued encoded frames, coalescing whatever is ready.
+
+    Waits for a frame, then drains anything else already queued (up to
+    BATCH_MAX_MESSAGES / BATCH_MAX_SIZE) and sends the frames produced by
+    coalesce(). A lone frame is sent unchanged. Raises SessionClosed once
+    a None sentinel has been reached.
+    """
+    while True:
+        first = await queue.get()
+        if first is None:
+            raise SessionClosed
+
+        batch = [first]
+        size = len(first)
+        stop = False
+        while len(batch) < BATCH_MAX_MESSAGES and size < BATCH_MAX_SIZE:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+            size += len(item)
+
+        if len(batch) == 1:
+            await send(first)
+        else:
+            for frame in coalesce(batch):
+                await send(frame)
+
+        if stop:
+            raise SessionClosed
+
+
+async def close_after_flush(queue: asyncio.Queue) -> None:
+    """Let the writer flush what is already queued, then end the session."""
+    try:
+        queue.put_nowait(None)
+    except asyncio.QueueFull:
+        pass
+    # The writer raises SessionClosed once flushed; this is the upper bound
+    await asyncio.sleep(FLUSH_TIMEOUT)
+    raise SessionClosed
@@ -6,9 +6,12 @@ all-in-one voice providers (OpenAI Realtime, Gemini Live, etc.)
 """
 
 import os
-import json
+import gc
+import asyncio
 import logging
-from urllib.parse import parse_qs
+import threading
+from typing import Union
+from urllib.parse import unquote_plus
 
 # Configure logging before importing FastAPI
 logging.basicConfig(level=logging.INFO)
@@ -16,24 +19,81 @@ logger = logging.getLogger(__name__)
 
 # Configure Azure Monitor OpenTelemetry if connection string is set
 APPINSIGHTS_CONNECTION_STRING = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
-if APPINSIGHTS_CONNECTION_STRING:
+
+
+def configure_telemetry() -> None:
+    """
+    Set up Azure Monitor exporters (slow: imports, resource detection).
+
+    Runs in a background thread so the service answers /health without
+    waiting for it. Its FastAPI instrumentation is disabled because that
+    only patches apps created afterwards; the app is instrumented
+    explicitly below, and its tracer picks up the provider set here.
+    """
     try:
         from azure.monitor.opentelemetry import configure_azure_monitor
         configure_azure_monitor(
             connection_string=APPINSIGHTS_CONNECTION_STRING,
             enable_live_metrics=True,
+            instrumentation_options={"fastapi": {"enabled": False}},
         )
         logger.info("Azure Monitor OpenTelemetry configured for eon-voice-claude")
     except Exception as e:
         logger.warning(f"Failed to configure Azure Monitor: {e}")
 
+
+# The app itself is instrumented on the main thread, because that has to
+# happen before it serves its first request (when the middleware stack is
+# built). Its import runs before the setup thread starts, so the two
+# threads never import the same opentelemetry packages at once.
+FastAPIInstrumentor = None
+if APPINSIGHTS_CONNECTION_STRING:
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    except Exception as e:
+        logger.warning(f"Failed to import FastAPI instrumentation: {e}")
+    threading.Thread(target=configure_telemetry, name="azure-monitor-setup", daemon=True).start()
+
+import msgspec
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.websockets import WebSocketState
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from .adapters import get_adapter, VoiceConfig
+from .fastbase64 import b64decode, is_base64_text
+from .protocol import (
+    AUDIO_FRAME_PREFIX,
+    AUDIO_OPCODE,
+    SEND_QUEUE_SIZE,
+    SUBPROTOCOL,
+    Audio,
+    ClientMessage,
+    Configure,
+    Connected,
+    Error,
+    FunctionCall,
+    FunctionResult,
+    SessionClosed,
+    SpeechStarted,
+    SpeechStopped,
+    Status,
+    Text,
+    Transcript,
+    close_after_flush,
+    coalesce_frames,
+    coalesce_json,
+    run_coalescing_writer,
+)
 
 app = FastAPI(title="Eon Voice Service (Claude)")
 
+if FastAPIInstrumentor is not None:
+    try:
+        FastAPIInstrumentor.instrument_app(app)
+    except Exception as e:
+        logger.warning(f"Failed to instrument FastAPI: {e}")
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -52,10 +112,149 @@ VOICE_NAME = os.getenv("VOICE_NAME", "alloy")
 
 DEFAULT_INSTRUCTIONS = """You are a helpful AI assistant with a warm, conversational personality."""
 
+# The adapter is fixed for the life of the process, so resolve it once;
+# an unknown name is reported to every session instead of failing startup
+try:
+    ADAPTER_CLASS = get_adapter(VOICE_ADAPTER)
+    ADAPTER_ERROR = None
+except ValueError as e:
+    ADAPTER_CLASS = None
+    ADAPTER_ERROR = str(e)
+
+# Set when this instance cannot serve any session; connections are then
+# refused during the WebSocket handshake
+if not VOICE_ENDPOINT or not VOICE_API_KEY:
+    UNAVAILABLE_REASON = "Voice service not configured. Set VOICE_ENDPOINT and VOICE_API_KEY."
+else:
+    UNAVAILABLE_REASON = ADAPTER_ERROR
+
+# Client codecs: MessagePack when the SUBPROTOCOL is negotiated, JSON otherwise.
+# Batches decode to raw elements that are validated one by one, so an
+# unknown message drops only itself rather than the whole array.
+json_decoder = msgspec.json.Decoder(Union[ClientMessage, list[msgspec.Raw]])
+json_message_decoder = msgspec.json.Decoder(ClientMessage)
+json_encoder = msgspec.json.Encoder()
+msgpack_decoder = msgspec.msgpack.Decoder(Union[ClientMessage, list[msgspec.Raw]])
+msgpack_message_decoder = msgspec.msgpack.Decoder(ClientMessage)
+msgpack_encoder = msgspec.msgpack.Encoder()
+
+
+def encode_json(msg) -> str:
+    return json_encoder.encode(msg).decode()
+
+
+# Fixed-shape messages, encoded once per codec (keyed by the binary flag).
+# Status frames are keyed by state; other states are encoded on demand.
+EVENT_FRAMES = {
+    binary: {
+        "connected": encode(Connected()),
+        "speech_started": encode(SpeechStarted()),
+        "speech_stopped": encode(SpeechStopped()),
+    }
+    for binary, encode in ((True, msgpack_encoder.encode), (False, encode_json))
+}
+STATUS_FRAMES = {
+    binary: {
+        state: encode(Status(state=state))
+        for state in ("ready", "listening", "processing")
+    }
+    for binary, encode in ((True, msgpack_encoder.encode), (False, encode_json))
+}
+
+
+class VoiceDispatcher:
+    """
+    Adapter callbacks for one voice session.
+
+    Turns adapter events into encoded client frames on the session's
+    outbound queue. Its bound methods are assigned as the adapter's
+    callbacks, so a session allocates one object instead of a closure
+    per callback.
+    """
+
+    __slots__ = ("queue", "user_id", "binary_audio", "encode", "events", "statuses")
+
+    def __init__(self, queue: asyncio.Queue, user_id: str, binary: bool, binary_audio: bool):
+        self.queue = queue
+        self.user_id = user_id
+        self.binary_audio = binary or binary_audio
+        self.encode = msgpack_encoder.encode if binary else encode_json
+        self.events = EVENT_FRAMES[binary]
+        self.statuses = STATUS_FRAMES[binary]
+
+    def attach(self, adapter) -> None:
+        """Install this dispatcher's methods as the adapter's callbacks."""
+        adapter.on_audio = self.on_audio
+        adapter.on_transcript = self.on_transcript
+        adapter.on_function_call = self.on_function_call
+        adapter.on_speech_started = self.on_speech_started
+        adapter.on_speech_stopped = self.on_speech_stopped
+        adapter.on_status = self.on_status
+        adapter.on_error = self.on_error
+
+    async def post(self, msg) -> None:
+        await self.queue.put(self.encode(msg))
+
+    async def on_audio(self, data: str):
+        if self.binary_audio:
+            await self.queue.put(AUDIO_FRAME_PREFIX + b64decode(data))
+        elif is_base64_text(data):
+            # Already base64: splice into the JSON message instead of round-tripping
+            await self.queue.put('{"type":"audio","data":"' + data + '"}')
+        else:
+            # Anything else could break the JSON frame: decode and re-encode
+            await self.post(Audio(data=b64decode(data)))
+
+    async def on_transcript(self, text: str):
+        # Called per transcript delta; the adapter logs the full response
+        await self.post(Transcript(text=text))
+
+    async def on_function_call(self, name: str, data: dict):
+        arguments = data["arguments"]
+        logger.info("[%s] Function call: %s args=%r", self.user_id, name, arguments)
+        raw_arguments = data.get("raw_arguments")
+        if raw_arguments is not None and self.encode is encode_json:
+            # Direct JSON clients only (the backend negotiates MessagePack and
+            # never takes this path): they get the provider's argument text
+            # verbatim (msgspec writes Raw values as-is) instead of the dict
+            # re-encoded
+            arguments = msgspec.Raw(raw_arguments)
+        # Forward to caller (backend handles tool execution)
+        await self.post(FunctionCall(name=name, call_id=data["call_id"], arguments=arguments))
+
+    async def on_connected(self):
+        """Tell the client the adapter is connected (not an adapter callback)."""
+        await self.queue.put(self.events["connected"])
+
+    async def on_speech_started(self):
+        await self.queue.put(self.events["speech_started"])
+
+    async def on_speech_stopped(self):
+        await self.queue.put(self.events["speech_stopped"])
+
+    async def on_status(self, status: str):
+        frame = self.statuses.get(status)
+        if frame is None:
+            frame = self.encode(Status(state=status))
+        await self.queue.put(frame)
+
+    async def on_error(self, error: str):
+        await self.post(Error(message=error))
+
 
 @app.get("/health")
 async def health():
-    """Health check endpoint."""
+    """Health check endpoint (503 while the service cannot serve sessions)."""
+    if UNAVAILABLE_REASON is not None:
+        return JSONResponse(
+            {
+                "status": "unavailable",
+                "reason": UNAVAILABLE_REASON,
+                "adapter": VOICE_ADAPTER,
+                "model": VOICE_MODEL
+            },
+            status_code=503,
+        )
     return {
         "status": "healthy",
         "adapter": VOICE_ADAPTER,
@@ -69,18 +268,28 @@ async def websocket_voice(websocket: WebSocket):
     WebSocket endpoint for voice communication.
 
     Query parameters:
-    - user_id: User identifier for tool calls
+    - user_id: User identifier for tool calls (the configure message's
+      user_id takes precedence)
 
     Configuration is received via WebSocket message after connection:
     - Send a "configure" message with instructions and tools
 
-    Message types from client:
-    - {type: "configure", instructions: "...", tools: [...]}
+    Clients that request the eon-msgpack-v1 subprotocol exchange the same
+    messages as MessagePack binary frames, with audio in binary audio
+    frames of raw PCM16 (see protocol.py). Other clients use JSON text
+    frames; they may send audio as binary audio frames at any time, and
+    receive audio that way too if they configure with binary_audio: true.
+
+    Message types from client (after configure, a frame may also be a
+    JSON array of these messages):
+    - {type: "configure", instructions: "...", tools: [...], user_id: "...", binary_audio: false, batch: false}
     - {type: "audio", data: "base64..."} - Audio input
     - {type: "text", text: "..."} - Text input (like typed message)
     - {type: "function_result", call_id: "...", result: {...}}
 
-    Message types to client:
+    Message types to client (on the subprotocol, or for JSON clients that
+    configure with batch: true, messages that are ready together are sent
+    as one array frame and consecutive binary audio frames are merged):
     - {type: "connected"}
     - {type: "audio", data: "base64..."} - Audio response
     - {type: "transcript", text: "..."} - Response transcript
@@ -90,55 +299,94 @@ async def websocket_voice(websocket: WebSocket):
     - {type: "status", state: "ready|listening|processing"}
     - {type: "error", message: "..."}
     """
-    await websocket.accept()
-
-    # Extract user_id from query string
-    query_string = websocket.scope.get("query_string", b"").decode()
-    params = parse_qs(query_string)
-    user_id = params.get("user_id", ["anonymous"])[0]
+    if UNAVAILABLE_REASON is not None:
+        # Answering the upgrade with a plain HTTP 503 rejects it before the
+        # handshake, so a misconfigured instance costs no configure round
+        # trip or close frame, and clients see a retryable status and the reason
+        logger.error(f"Refusing voice session: {UNAVAILABLE_REASON}")
+        await websocket.send_denial_response(PlainTextResponse(UNAVAILABLE_REASON, status_code=503))
+        return
 
-    logger.info(f"Voice session starting: user_id={user_id}, adapter={VOICE_ADAPTER}")
+    binary = SUBPROTOCOL in websocket.scope.get("subprotocols", ())
+    await websocket.accept(subprotocol=SUBPROTOCOL if binary else None)
+
+    encode = msgpack_encoder.encode if binary else encode_json
+    decode_message = msgpack_message_decoder.decode if binary else json_message_decoder.decode
+
+    async def send(msg) -> None:
+        # Direct send, for the setup phase before the session writer runs
+        if binary:
+            await websocket.send_bytes(encode(msg))
+        else:
+            await websocket.send_text(encode(msg))
+
+    async def receive():
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        data = message.get("bytes")
+        if data is None:
+            return json_decoder.decode(message["text"])
+        # Binary frames are audio frames in either mode, or MessagePack
+        if data and data[0] == AUDIO_OPCODE:
+            return Audio(data=data[1:])
+        if not binary:
+            raise msgspec.ValidationError("Binary frame is not an audio frame")
+        return msgpack_decoder.decode(data)
+
+    # Extract user_id from the raw query string (first non-empty value,
+    # as parse_qs would give) without building a dict of all parameters
+    user_id = "anonymous"
+    for part in websocket.scope.get("query_string", b"").split(b"&"):
+        if part.startswith(b"user_id=") and len(part) > 8:
+            user_id = unquote_plus(part[8:].decode())
+            break
+
+    logger.debug("Voice session starting: user_id=%s", user_id)
 
     # Wait for configuration message with instructions and tools
     try:
-        config_msg = await websocket.receive_json()
-        if config_msg.get("type") != "configure":
-            await websocket.send_json({
-                "type": "error",
-                "message": "Expected 'configure' message with instructions and tools"
-            })
+        config_msg = await receive()
+        if not isinstance(config_msg, Configure):
+            await send(Error(message="Expected 'configure' message with instructions and tools"))
             await websocket.close()
             return
 
-        instructions = config_msg.get("instructions", DEFAULT_INSTRUCTIONS)
-        tools = config_msg.get("tools", [])
-        greeting_cue = config_msg.get("greeting_cue")  # Specific greeting to use
-        logger.info(f"Received config: {len(instructions)} chars instructions, {len(tools)} tools, greeting_cue={greeting_cue}")
-    except Exception as e:
-        logger.error(f"Failed to receive config: {e}")
-        await websocket.send_json({"type": "error", "message": f"Config error: {e}"})
+        instructions = config_msg.instructions if config_msg.instructions is not None else DEFAULT_INSTRUCTIONS
+        tools = config_msg.tools
+        greeting_cue = config_msg.greeting_cue  # Specific greeting to use
+        binary_audio = config_msg.binary_audio
+        batch = config_msg.batch
+        if config_msg.user_id is not None:
+            user_id = config_msg.user_id
+    except WebSocketDisconnect:
+        # Idle pooled connections are closed without ever being configured
+        logger.info(f"Voice session closed before configure: user_id={user_id}")
+        return
+    except msgspec.ValidationError as e:
+        # Well-formed, but not a message this service accepts
+        logger.warning("Invalid configure message: user_id=%s: %s", user_id, e)
+        await send(Error(message=f"Invalid configure message: {e}"))
         await websocket.close()
         return
-
-    logger.info(f"Voice session configured: user_id={user_id}, adapter={VOICE_ADAPTER}")
-
-    # Check configuration
-    if not VOICE_ENDPOINT or not VOICE_API_KEY:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Voice service not configured. Set VOICE_ENDPOINT and VOICE_API_KEY."
-        })
+    except msgspec.DecodeError as e:
+        logger.warning("Malformed configure message: user_id=%s: %s", user_id, e)
+        await send(Error(message=f"Malformed configure message: {e}"))
         await websocket.close()
         return
-
-    # Create adapter
-    try:
-        AdapterClass = get_adapter(VOICE_ADAPTER)
-    except ValueError as e:
-        await websocket.send_json({"type": "error", "message": str(e)})
+    except Exception as e:
+        logger.error(f"Failed to receive config: {e}")
+        await send(Error(message=f"Config error: {e}"))
         await websocket.close()
         return
 
+    # The one INFO line per session setup
+    logger.info(
+        "Voice session configured: user_id=%s, adapter=%s, instructions=%d chars, tools=%d, greeting_cue=%s",
+        user_id, VOICE_ADAPTER, len(instructions), len(tools), greeting_cue,
+    )
+
+    # Create adapter
     config = VoiceConfig(
         endpoint=VOICE_ENDPOINT,
         api_key=VOICE_API_KEY,
@@ -149,77 +397,121 @@ async def websocket_voice(websocket: WebSocket):
         tools=tools,
         greeting_cue=greeting_cue,
     )
-    adapter = AdapterClass(config)
-
-    # Set up callbacks to forward events to WebSocket client
-    async def on_audio(data: str):
-        await websocket.send_json({"type": "audio", "data": data})
-
-    async def on_transcript(text: str):
-        logger.info(f"[{user_id}] Transcript: {text}")
-        await websocket.send_json({"type": "transcript", "text": text})
-
-    async def on_function_call(name: str, data: dict):
-        logger.info(f"[{user_id}] Function call: {name} args={data.get('arguments', {})}")
-        # Forward to caller (backend handles tool execution)
-        await websocket.send_json({
-            "type": "function_call",
-            "name": name,
-            "call_id": data["call_id"],
-            "arguments": data["arguments"]
-        })
-
-    async def on_speech_started():
-        await websocket.send_json({"type": "speech_started"})
-
-    async def on_speech_stopped():
-        await websocket.send_json({"type": "speech_stopped"})
-
-    async def on_status(status: str):
-        await websocket.send_json({"type": "status", "state": status})
-
-    async def on_error(error: str):
-        await websocket.send_json({"type": "error", "message": error})
-
-    adapter.on_audio = on_audio
-    adapter.on_transcript = on_transcript
-    adapter.on_function_call = on_function_call
-    adapter.on_speech_started = on_speech_started
-    adapter.on_speech_stopped = on_speech_stopped
-    adapter.on_status = on_status
-    adapter.on_error = on_error
-
-    try:
-        await adapter.connect()
-        await websocket.send_json({"type": "connected"})
-
-        while True:
-            data = await websocket.receive_json()
-            msg_type = data.get("type")
-
-            if msg_type == "audio":
-                await adapter.send_audio(data.get("data", ""))
-
-            elif msg_type == "text":
-                # Text input - send as user message
-                text = data.get("text", "")
-                logger.info(f"[{user_id}] Received text input: {text[:50]}...")
-                await websocket.send_json({"type": "status", "state": "processing"})
-                await adapter.send_text(text)
-
-            elif msg_type == "function_result":
-                call_id = data.get("call_id")
-                result = data.get("result", {})
-                logger.info(f"[{user_id}] Function result: call_id={call_id} result={result}")
-                await adapter.send_function_result(call_id, result)
-
-    except WebSocketDisconnect:
-        logger.info("WebSocket disconnected")
-    except Exception as e:
-        logger.error(f"Voice session error: {e}")
+    adapter = ADAPTER_CLASS(config)
+
+    # From here on all output goes through one coalescing writer, so events
+    # that arrive while a write is in flight leave together: MessagePack
+    # messages as one array, consecutive audio frames as one audio frame,
+    # JSON messages as one JSON array. JSON clients that did not opt in
+    # (e.g. an older backend during a rollout) get every frame on its own.
+    outbound: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+    if binary:
+        writer = run_coalescing_writer(outbound, websocket.send_bytes, coalesce_frames)
+    else:
+        async def send_frame(frame: Union[str, bytes]):
+            if isinstance(frame, bytes):
+                await websocket.send_bytes(frame)
+            else:
+                await websocket.send_text(frame)
+
+        writer = run_coalescing_writer(outbound, send_frame, coalesce_json if batch else list)
+
+    # Forward adapter events to the WebSocket client
+    dispatcher = VoiceDispatcher(outbound, user_id, binary, binary_audio)
+    dispatcher.attach(adapter)
+
+    async def forward_from_client():
+        """Connect the adapter, then feed it client messages until the client leaves."""
         try:
-            await websocket.send_json({"type": "error", "message": str(e)})
-        except Exception:
-            pass
+            await adapter.connect()
+            await dispatcher.on_connected()
+
+            # Loop invariants: bind once instead of looking up per message
+            send_audio = adapter.send_audio
+            send_text = adapter.send_text
+            send_function_result = adapter.send_function_result
+            on_status = dispatcher.on_status
+
+            while True:
+                try:
+                    payload = await receive()
+                except msgspec.ValidationError as e:
+                    logger.debug("[%s] Ignoring unknown message: %s", user_id, e)
+                    continue
+
+                # Clients may coalesce ready messages into a single array frame
+                if isinstance(payload, list):
+                    messages = []
+                    for raw in payload:
+                        try:
+                            messages.append(decode_message(raw))
+                        except msgspec.ValidationError as e:
+                            logger.debug("[%s] Ignoring unknown message: %s", user_id, e)
+                else:
+                    messages = (payload,)
+
+                for msg in messages:
+                    # Class patterns dispatch on the Struct type and read the
+                    # fields as attributes; audio, the hot path, is tried first
+                    match msg:
+                        case Audio(data=data):
+                            await send_audio(data)
+
+                        case Text(text=text):
+                            # Text input - send as user message
+                            logger.info("[%s] Received text input: %.50s...", user_id, text)
+                            await on_status("processing")
+                            await send_text(text)
+
+                        case FunctionResult(call_id=call_id, result=result):
+                            logger.info("[%s] Function result: call_id=%s result=%r", user_id, call_id, result)
+                            await send_function_result(call_id, result)
+
+        except WebSocketDisconnect:
+            # Nobody left to flush to: end the session right away
+            logger.info("[%s] WebSocket disconnected", user_id)
+            raise SessionClosed
+        except Exception as e:
+            logger.error("[%s] Voice session error: %s", user_id, e)
+            try:
+                outbound.put_nowait(encode(Error(message=str(e))))
+            except asyncio.QueueFull:
+                pass
+        await close_after_flush(outbound)
+
+    # The receive loop and the writer run as one unit: the first to raise
+    # (SessionClosed when the session ends, or a failed send to a client
+    # that is gone) cancels the other. Afterwards the adapter is released
+    # and the client is closed if it is still there; uvicorn does not close
+    # it when the handler returns, and the backend's session ends with it.
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(forward_from_client())
+            tg.create_task(writer)
+    except* SessionClosed:
+        pass
+    except* Exception as eg:
+        for e in eg.exceptions:
+            logger.error("[%s] Session error: %s", user_id, e)
     finally:
         await adapter.disconnect()
+        if websocket.client_state is WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+# Everything allocated so far (modules, app, codecs, pre-encoded frames)
+# lives as long as the process. Move it out of the collector's generations
+# so collections triggered by session churn stop rescanning it.
+gc.freeze()
+
+
+if __name__ == "__main__":
+    # Same event loop and protocol stack as the container command
+    # (python -m src.server)
+    import uvicorn
+    uvicorn.run(
+        app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools", ws="websockets",
+        ws_ping_interval=20.0, ws_ping_timeout=20.0,
+    )